@@ -1,7 +1,14 @@
 import streamlit as st
 import geopandas as gpd
 import pandas as pd
+import numpy as np
 import folium
+import orjson
+import pyarrow.csv as pacsv
+import pyogrio
+import pyproj
+import shapely
+import streamlit.components.v1 as components
 from streamlit_folium import st_folium
 import os
 import warnings
@@ -18,46 +25,180 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+FIELD_LABELS = {
+    'UF': 'UF',
+    'MUNICIPIO': 'Município',
+    'EMPRESA': 'Empresa',
+    'FAZENDA': 'Fazenda'
+}
+POPUP_FIELDS = ['UF', 'MUNICIPIO', 'EMPRESA', 'FAZENDA']
+TOOLTIP_FIELDS = ['UF', 'FAZENDA']
+# Arquivos que compõem o shapefile; qualquer alteração invalida os caches em disco
+SHAPEFILE_EXTENSIONS = ['.shp', '.shx', '.dbf', '.prj', '.cpg']
+# Limite de mapas/viewports em cache (cada pan gera uma nova entrada)
+MAP_CACHE_MAX_ENTRIES = 32
+# Acima deste número de vértices o mapa passa a carregar apenas o viewport
+STATIC_MAP_MAX_VERTICES = 200_000
+
 # =========================================
 # 2. FUNÇÕES AUXILIARES
 # =========================================
+@st.cache_resource
+def get_transformer(src_crs, dst_crs):
+    """Retorna um pyproj.Transformer (always_xy) reaproveitado entre cargas."""
+    return pyproj.Transformer.from_crs(src_crs, dst_crs, always_xy=True)
+
+def ensure_wgs84(gdf):
+    """Reprojeta para WGS84 (EPSG:4326) apenas quando necessário."""
+    if gdf.crs is None:
+        raise ValueError("Shapefile sem CRS definido (.prj ausente); não é possível reprojetar para WGS84.")
+    if gdf.crs.to_epsg() == 4326:
+        return gdf
+    transformer = get_transformer(gdf.crs.to_wkt(), 'EPSG:4326')
+    # Coordenadas em colunas (x, y) ou (x, y, z); a altitude Z é preservada
+    geometries = shapely.transform(
+        gdf.geometry.to_numpy(),
+        lambda coords: np.column_stack(transformer.transform(*coords.T)),
+        include_z=bool(gdf.has_z.any())
+    )
+    return gdf.set_geometry(gpd.GeoSeries(geometries, index=gdf.index, crs='EPSG:4326'))
+
+def get_bounds(gdf):
+    """Retorna (minx, miny, maxx, maxy), usando os limites guardados na carga."""
+    if 'bounds' in gdf.attrs:
+        return gdf.attrs['bounds']
+    return tuple(gdf.total_bounds)
+
+def get_num_vertices(gdf):
+    """Retorna o total de vértices, usando o valor guardado na carga."""
+    if 'num_vertices' in gdf.attrs:
+        return gdf.attrs['num_vertices']
+    return int(shapely.get_num_coordinates(gdf.geometry.values).sum())
+
+def shapefile_mtime(file_path):
+    """Data de modificação mais recente entre o .shp e seus arquivos auxiliares."""
+    base = os.path.splitext(file_path)[0]
+    sidecars = [base + ext for ext in SHAPEFILE_EXTENSIONS]
+    return max(os.path.getmtime(path) for path in sidecars if os.path.exists(path))
+
+@st.cache_data
+def read_shapefile(file_path):
+    """Lê o shapefile completo do disco sem transformações (cache da leitura bruta).
+
+    A leitura é persistida em GeoParquet ao lado do .shp e reaproveitada nas
+    cargas seguintes.
+    """
+    parquet_path = os.path.splitext(file_path)[0] + '.parquet'
+    if (os.path.exists(parquet_path)
+            and os.path.getmtime(parquet_path) >= shapefile_mtime(file_path)):
+        try:
+            return gpd.read_parquet(parquet_path)
+        except Exception:
+            pass
+    gdf = gpd.read_file(file_path, engine='pyogrio', use_arrow=True)
+    # Grava em arquivo temporário e substitui atomicamente, para que uma
+    # escrita interrompida nunca deixe um .parquet truncado no lugar
+    tmp_path = parquet_path + '.tmp'
+    try:
+        gdf.to_parquet(tmp_path, compression='snappy')
+        os.replace(tmp_path, parquet_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return gdf
+
+@st.cache_data
+def load_attributes(file_path):
+    """Carrega apenas a tabela de atributos (DBF), sem decodificar geometrias."""
+    try:
+        df = pyogrio.read_dataframe(file_path, read_geometry=False, use_arrow=True)
+        return convert_timestamps(df)
+    except Exception as e:
+        st.error(f"Erro ao carregar shapefile: {e}")
+        return None
+
 @st.cache_data
-def load_shapefile(file_path):
-    """Carrega shapefile com cache e reprojeção WGS84."""
+def load_shapefile(file_path, where=None):
+    """Carrega shapefile com cache, conversão de timestamps e reprojeção WGS84.
+
+    Com ``where`` (SQL), o filtro é aplicado pelo GDAL durante a leitura e só
+    as feições selecionadas são decodificadas.
+    """
     try:
-        gdf = gpd.read_file(file_path)
-        if gdf.crs != 'EPSG:4326':
-            gdf = gdf.to_crs('EPSG:4326')
+        if where is None:
+            gdf = read_shapefile(file_path)
+        else:
+            gdf = gpd.read_file(file_path, engine='pyogrio', use_arrow=True, where=where)
+        gdf = convert_timestamps(gdf)
+        gdf = ensure_wgs84(gdf)
+        # Limites calculados uma única vez por carga, reaproveitados em todas as abas
+        gdf.attrs['bounds'] = tuple(gdf.total_bounds)
+        gdf.attrs['num_vertices'] = int(shapely.get_num_coordinates(gdf.geometry.values).sum())
         return gdf
     except Exception as e:
         st.error(f"Erro ao carregar shapefile: {e}")
         return None
 
+@st.cache_data
+def export_flatgeobuf(file_path):
+    """Converte o shapefile (WGS84) em FlatGeobuf com índice espacial.
+
+    Retorna None se o arquivo não puder ser gravado (ex.: disco somente leitura).
+    """
+    fgb_path = os.path.splitext(file_path)[0] + '.fgb'
+    if (not os.path.exists(fgb_path)
+            or os.path.getmtime(fgb_path) < shapefile_mtime(file_path)):
+        gdf = load_shapefile(file_path)
+        if gdf is None:
+            return None
+        tmp_path = os.path.splitext(file_path)[0] + '.tmp.fgb'
+        try:
+            pyogrio.write_dataframe(gdf, tmp_path, driver='FlatGeobuf', spatial_index=True)
+            os.replace(tmp_path, fgb_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+    return fgb_path
+
+@st.cache_data(max_entries=MAP_CACHE_MAX_ENTRIES)
+def load_viewport(fgb_path, bbox, where=None):
+    """Lê do FlatGeobuf apenas as feições que intersectam o bbox."""
+    try:
+        gdf = pyogrio.read_dataframe(fgb_path, bbox=bbox, where=where, use_arrow=True)
+        return convert_timestamps(gdf)
+    except Exception as e:
+        st.error(f"Erro ao carregar feições do mapa: {e}")
+        return None
+
+def _clean_csv(df):
+    """Remove espaços extras e linhas vazias do CSV (operações vetorizadas)."""
+    df = df.rename(columns=str.strip)
+    df = df.dropna(how='all')
+    for col in df.columns:
+        if pd.api.types.is_string_dtype(df[col]):
+            df[col] = df[col].str.strip()
+    return df
+
 @st.cache_data
 def load_csv(file_path):
     """Carrega CSV com detecção automática de codificação e separador."""
     try:
         encodings = ['utf-8', 'latin-1', 'iso-8859-1', 'cp1252', 'utf-16']
+        separators = [';', ',']
         
         for encoding in encodings:
-            try:
-                # Tentar com ponto-e-vírgula
-                df = pd.read_csv(file_path, encoding=encoding, sep=';')
-                # Remover espaços extras dos nomes das colunas
-                df.columns = df.columns.str.strip()
-                # Limpar dados
-                df = df.dropna(how='all')
-                df = df.apply(lambda x: x.str.strip() if x.dtype == 'object' else x)
-                return df
-            except:
+            for sep in separators:
                 try:
-                    # Tentar com vírgula
-                    df = pd.read_csv(file_path, encoding=encoding, sep=',')
-                    df.columns = df.columns.str.strip()
-                    df = df.dropna(how='all')
-                    df = df.apply(lambda x: x.str.strip() if x.dtype == 'object' else x)
-                    return df
-                except:
+                    table = pacsv.read_csv(
+                        file_path,
+                        read_options=pacsv.ReadOptions(encoding=encoding),
+                        parse_options=pacsv.ParseOptions(delimiter=sep),
+                        # Células vazias viram nulo, como no pd.read_csv
+                        convert_options=pacsv.ConvertOptions(strings_can_be_null=True)
+                    )
+                    return _clean_csv(table.to_pandas(types_mapper=pd.ArrowDtype))
+                except Exception:
                     continue
         
         st.error("Não foi possível detectar a codificação do arquivo CSV")
@@ -66,6 +207,51 @@ def load_csv(file_path):
         st.error(f"Erro ao carregar CSV: {e}")
         return None
 
+def _sorted_values(series):
+    """Valores distintos e não nulos de uma coluna, ordenados."""
+    return sorted(series.dropna().unique().tolist())
+
+@st.cache_data
+def load_filter_options(file_path):
+    """Pré-calcula as opções dos filtros da sidebar uma vez por shapefile."""
+    df = load_attributes(file_path)
+    return {
+        'UF': _sorted_values(df['UF']),
+        'EMPRESA': _sorted_values(df['EMPRESA']),
+        'FAZENDA_BY_EMPRESA': {
+            empresa: _sorted_values(group)
+            for empresa, group in df.groupby('EMPRESA')['FAZENDA']
+        },
+        'MUNICIPIO_BY_UF': {
+            uf: _sorted_values(group)
+            for uf, group in df.groupby('UF')['MUNICIPIO']
+        }
+    }
+
+def build_where_clause(filters):
+    """Monta cláusula SQL WHERE (pyogrio/GDAL) a partir dos filtros selecionados.
+
+    Um filtro sem valor selecionado (None) não corresponde a nenhuma feição.
+    """
+    conditions = []
+    for col, value in filters.items():
+        if value is None:
+            return '1 = 0'
+        escaped = str(value).replace("'", "''")
+        conditions.append(f"{col} = '{escaped}'")
+    return ' AND '.join(conditions) or None
+
+@st.cache_data
+def load_csv_groups(file_path, columns):
+    """Índice das posições das linhas do CSV por combinação de valores das colunas.
+
+    Retorna None se alguma das colunas não existir no CSV.
+    """
+    df = load_csv(file_path)
+    if df is None or any(col not in df.columns for col in columns):
+        return None
+    return df.groupby(list(columns), sort=False).indices
+
 def validate_columns(df, required_cols, df_name="DataFrame"):
     """Valida se as colunas obrigatórias existem."""
     missing_cols = [col for col in required_cols if col not in df.columns]
@@ -75,20 +261,65 @@ def validate_columns(df, required_cols, df_name="DataFrame"):
     return True
 
 def convert_timestamps(df):
-    """Converte timestamps para string."""
-    df_copy = df.copy()
-    for col in df_copy.select_dtypes(include=['datetime64[ns]']).columns:
-        df_copy[col] = df_copy[col].astype(str)
-    return df_copy
-
-def generate_map(gdf_filtered, tipo_exibicao):
-    """Gera mapa Folium com cores dinâmicas."""
+    """Converte timestamps e colunas de texto para tipos string vetorizados.
+
+    Modifica ``df`` no lugar e o retorna; o chamador deve ser dono do objeto
+    (ex.: resultado recém-lido dentro de uma função com cache).
+    """
+    dt_cols = df.select_dtypes(include=['datetime64', 'datetimetz']).columns
+    if len(dt_cols):
+        df[dt_cols] = df[dt_cols].astype(str)
+    obj_cols = df.select_dtypes(include=['object']).columns.difference(['geometry'])
+    if len(obj_cols):
+        df[obj_cols] = df[obj_cols].astype('string[pyarrow]')
+    return df
+
+def _json_default(obj):
+    """Serializa valores ausentes do pandas (pd.NA) como null."""
+    if obj is pd.NA:
+        return None
+    raise TypeError
+
+def gdf_to_geojson(gdf):
+    """Converte GeoDataFrame em FeatureCollection GeoJSON (dict).
+
+    As geometrias saem como texto GeoJSON do GEOS (shapely.to_geojson) e são
+    concatenadas com os atributos em um único texto, decodificado uma só vez
+    pelo orjson. O folium recebe o dict pronto, sem reprocessar o JSON.
+    """
+    geometries = shapely.to_geojson(gdf.geometry.values)
+    properties = gdf.drop(columns='geometry').to_dict(orient='records')
+    features = [
+        '{"type":"Feature","properties":'
+        + orjson.dumps(props, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+        + ',"geometry":' + (geom if geom is not None else 'null') + '}'
+        for geom, props in zip(geometries, properties)
+    ]
+    payload = '{"type":"FeatureCollection","features":[' + ','.join(features) + ']}'
+    return orjson.loads(payload)
+
+def generate_map(gdf_filtered, tipo_exibicao, view=None, simplify=True):
+    """Gera mapa Folium com cores dinâmicas.
+
+    ``view`` é um par ((lat, lon), zoom) que preserva o enquadramento atual
+    do usuário; sem ele o mapa é ajustado aos limites das feições. Com
+    ``simplify=False`` as geometrias são enviadas em resolução completa.
+    """
     if gdf_filtered.empty:
+        if view is not None:
+            return folium.Map(location=view[0], zoom_start=view[1])
         return folium.Map(location=[-15.0, -55.0], zoom_start=4)
     
-    m = folium.Map()
-    bounds = gdf_filtered.total_bounds
-    m.fit_bounds([[bounds[1], bounds[0]], [bounds[3], bounds[2]]])
+    if view is None:
+        m = folium.Map()
+        bounds = get_bounds(gdf_filtered)
+        m.fit_bounds([[bounds[1], bounds[0]], [bounds[3], bounds[2]]])
+        # Detalhes menores que ~1 pixel do enquadramento inicial não são visíveis
+        tolerance = (bounds[2] - bounds[0]) / 2000
+    else:
+        m = folium.Map(location=view[0], zoom_start=view[1])
+        # Graus por pixel no nível de zoom atual (tiles de 256 px)
+        tolerance = 360 / (256 * 2 ** view[1])
     
     color_map = {
         'Todos os Dados': 'gray',
@@ -99,29 +330,79 @@ def generate_map(gdf_filtered, tipo_exibicao):
     }
     color = color_map.get(tipo_exibicao, 'blue')
     
-    for _, row in gdf_filtered.iterrows():
-        geom = row.geometry
-        popup_text = (
-            f"<b>UF:</b> {row.get('UF', 'N/A')}<br>"
-            f"<b>Município:</b> {row.get('MUNICIPIO', 'N/A')}<br>"
-            f"<b>Empresa:</b> {row.get('EMPRESA', 'N/A')}<br>"
-            f"<b>Fazenda:</b> {row.get('FAZENDA', 'N/A')}"
+    # Serializa apenas os campos exibidos e que possuem algum valor
+    popup_fields = [
+        c for c in POPUP_FIELDS
+        if c in gdf_filtered.columns and gdf_filtered[c].notna().any()
+    ]
+    tooltip_fields = [c for c in TOOLTIP_FIELDS if c in popup_fields]
+    
+    gdf_viz = gdf_filtered[['geometry', *popup_fields]]
+    if simplify:
+        # preserve_topology=True nunca reduz um polígono a geometria vazia
+        gdf_viz = gdf_viz.assign(
+            geometry=gdf_viz.geometry.simplify(tolerance, preserve_topology=True)
         )
-        
-        folium.GeoJson(
-            geom,
-            style_function=lambda x: {
-                'fillColor': color,
-                'color': color,
-                'weight': 1,
-                'fillOpacity': 0.6
-            },
-            popup=folium.Popup(popup_text, max_width=300),
-            tooltip=f"{row.get('UF', 'N/A')} - {row.get('FAZENDA', 'N/A')}"
-        ).add_to(m)
+    
+    folium.GeoJson(
+        gdf_to_geojson(gdf_viz),
+        style_function=lambda x: {
+            'fillColor': color,
+            'color': color,
+            'weight': 1,
+            'fillOpacity': 0.6
+        },
+        popup=folium.GeoJsonPopup(
+            fields=popup_fields,
+            aliases=[f"{FIELD_LABELS[c]}:" for c in popup_fields],
+            max_width=300
+        ) if popup_fields else None,
+        tooltip=folium.GeoJsonTooltip(
+            fields=tooltip_fields,
+            aliases=[f"{FIELD_LABELS[c]}:" for c in tooltip_fields]
+        ) if tooltip_fields else None
+    ).add_to(m)
     
     return m
 
+@st.cache_resource(max_entries=MAP_CACHE_MAX_ENTRIES)
+def build_map(tipo_exibicao, filter_key, _gdf_filtered, view=None, simplify=True):
+    """Mantém em cache o mapa Folium de cada combinação de filtros."""
+    return generate_map(_gdf_filtered, tipo_exibicao, view, simplify)
+
+@st.cache_resource(max_entries=MAP_CACHE_MAX_ENTRIES)
+def render_map_html(tipo_exibicao, filter_key, _gdf_filtered):
+    """Renderiza o mapa em HTML uma única vez por combinação de filtros.
+
+    O HTML não é atualizado com o zoom, então as geometrias vão sem simplificação.
+    """
+    # Chama generate_map diretamente: só o HTML fica em cache, não o folium.Map
+    m = generate_map(_gdf_filtered, tipo_exibicao, simplify=False)
+    return m.get_root().render()
+
+def viewport_bbox(map_state):
+    """Extrai (minx, miny, maxx, maxy) dos limites retornados pelo st_folium."""
+    bounds = (map_state or {}).get('bounds') or {}
+    sw = bounds.get('_southWest') or {}
+    ne = bounds.get('_northEast') or {}
+    if None in (sw.get('lng'), sw.get('lat'), ne.get('lng'), ne.get('lat')):
+        return None
+    return (sw['lng'], sw['lat'], ne['lng'], ne['lat'])
+
+def expand_bbox(bbox, factor=0.5):
+    """Amplia o bbox em ``factor`` vezes sua largura/altura em cada lado."""
+    dx = (bbox[2] - bbox[0]) * factor
+    dy = (bbox[3] - bbox[1]) * factor
+    return (bbox[0] - dx, bbox[1] - dy, bbox[2] + dx, bbox[3] + dy)
+
+def bbox_needs_fetch(fetched, bbox):
+    """Indica se o viewport saiu da área já carregada ou ficou muito menor que ela."""
+    inside = (bbox[0] >= fetched[0] and bbox[1] >= fetched[1]
+              and bbox[2] <= fetched[2] and bbox[3] <= fetched[3])
+    area = (bbox[2] - bbox[0]) * (bbox[3] - bbox[1])
+    fetched_area = (fetched[2] - fetched[0]) * (fetched[3] - fetched[1])
+    return not inside or fetched_area > 16 * area
+
 def calculate_metrics(gdf_filtered):
     """Calcula métricas do GeoDataFrame."""
     num_features = len(gdf_filtered)
@@ -160,12 +441,10 @@ if not os.path.exists(GEO_PATH):
     st.error(f"Arquivo não encontrado: {GEO_PATH}")
     st.stop()
 
-gdf = load_shapefile(GEO_PATH)
-if gdf is None:
+df_attributes = load_attributes(GEO_PATH)
+if df_attributes is None:
     st.stop()
 
-gdf = convert_timestamps(gdf)
-
 # Carregar CSV
 df_csv = None
 if os.path.exists(CSV_PATH):
@@ -196,7 +475,8 @@ tipo_dado = st.sidebar.selectbox(
 st.sidebar.markdown("---")
 
 # Filtros dinâmicos
-gdf_filtered = gdf.copy()
+filter_options = load_filter_options(GEO_PATH)
+shape_filter = {}
 tipo_exibicao = tipo_dado
 selected_uf = None
 selected_empresa = None
@@ -204,50 +484,48 @@ selected_fazenda = None
 selected_municipio = None
 
 if tipo_dado == 'Dados por Estado':
-    uf_options = sorted(gdf['UF'].unique())
+    uf_options = filter_options['UF']
     selected_uf = st.sidebar.selectbox("Selecione UF", uf_options)
-    gdf_filtered = gdf[gdf['UF'] == selected_uf]
+    shape_filter = {'UF': selected_uf}
     tipo_exibicao = 'Dados por Estado'
 
 elif tipo_dado == 'Dados por Empresa':
-    empresa_options = sorted(gdf['EMPRESA'].unique())
+    empresa_options = filter_options['EMPRESA']
     selected_empresa = st.sidebar.selectbox("Selecione Empresa", empresa_options)
-    gdf_filtered = gdf[gdf['EMPRESA'] == selected_empresa]
+    shape_filter = {'EMPRESA': selected_empresa}
     tipo_exibicao = 'Dados por Empresa'
 
 elif tipo_dado == 'Dados Empresa/Fazenda':
-    empresa_options = sorted(gdf['EMPRESA'].unique())
+    empresa_options = filter_options['EMPRESA']
     selected_empresa = st.sidebar.selectbox("Selecione Empresa", empresa_options)
     
     if selected_empresa:
-        fazenda_options = sorted(gdf[gdf['EMPRESA'] == selected_empresa]['FAZENDA'].unique())
+        fazenda_options = filter_options['FAZENDA_BY_EMPRESA'].get(selected_empresa, [])
         selected_fazenda = st.sidebar.selectbox("Selecione Fazenda", fazenda_options)
-        
-        gdf_filtered = gdf[
-            (gdf['EMPRESA'] == selected_empresa) &
-            (gdf['FAZENDA'] == selected_fazenda)
-        ]
+        shape_filter = {'EMPRESA': selected_empresa, 'FAZENDA': selected_fazenda}
     tipo_exibicao = 'Dados Empresa/Fazenda'
 
 elif tipo_dado == 'Dados por Município':
-    uf_options = sorted(gdf['UF'].unique())
+    uf_options = filter_options['UF']
     selected_uf = st.sidebar.selectbox("Selecione UF", uf_options)
     
     if selected_uf:
-        municipio_options = sorted(gdf[gdf['UF'] == selected_uf]['MUNICIPIO'].unique())
+        municipio_options = filter_options['MUNICIPIO_BY_UF'].get(selected_uf, [])
         selected_municipio = st.sidebar.selectbox("Selecione Município", municipio_options)
-        
-        gdf_filtered = gdf[
-            (gdf['UF'] == selected_uf) &
-            (gdf['MUNICIPIO'] == selected_municipio)
-        ]
+        shape_filter = {'UF': selected_uf, 'MUNICIPIO': selected_municipio}
     tipo_exibicao = 'Dados por Município'
 
+# Sem filtro, usa a leitura completa em cache; com filtro, só as feições selecionadas
+where_clause = build_where_clause(shape_filter)
+gdf_filtered = load_shapefile(GEO_PATH, where_clause)
+if gdf_filtered is None:
+    st.stop()
+
 st.sidebar.markdown("---")
 
 # Status
 st.sidebar.success("✅ Geo.shp carregado!")
-st.sidebar.write(f"📊 Total de Feições: {len(gdf)}")
+st.sidebar.write(f"📊 Total de Feições: {len(df_attributes)}")
 st.sidebar.write(f"🎯 Feições Filtradas: {len(gdf_filtered)}")
 
 if df_csv is not None:
@@ -262,8 +540,50 @@ tab1, tab2, tab3, tab4 = st.tabs(["🗺️ Mapa Principal", "📊 Informações"
 # ===== ABA 1: MAPA =====
 with tab1:
     st.header("Mapa Principal")
-    m = generate_map(gdf_filtered, tipo_exibicao)
-    st_folium(m, width=1400, height=600)
+    filter_key = (selected_uf, selected_empresa, selected_fazenda, selected_municipio)
+    if get_num_vertices(gdf_filtered) <= STATIC_MAP_MAX_VERTICES:
+        # Mapa estático: HTML pré-renderizado em cache, sem reexecutar o Folium
+        components.html(render_map_html(tipo_exibicao, filter_key, gdf_filtered), height=600)
+    else:
+        fgb_path = export_flatgeobuf(GEO_PATH)
+        viewport = st.session_state.get('map_viewport')
+        if viewport is not None and viewport['filter_key'] != filter_key:
+            viewport = None
+        
+        # Sem FlatGeobuf (ex.: disco somente leitura) o mapa mostra todas as feições
+        streaming = fgb_path is not None
+        gdf_map = None
+        if viewport is not None and streaming:
+            gdf_map = load_viewport(fgb_path, viewport['fetched'], where_clause)
+            streaming = gdf_map is not None
+        if gdf_map is not None:
+            view = (viewport['center'], viewport['zoom'])
+            m = build_map(tipo_exibicao, filter_key + (viewport['fetched'],), gdf_map, view)
+        else:
+            m = build_map(tipo_exibicao, filter_key, gdf_filtered)
+        map_state = st_folium(m, width=1400, height=600)
+        
+        # Recarrega apenas as feições do viewport quando o usuário navega no mapa
+        bbox = viewport_bbox(map_state)
+        center = (map_state or {}).get('center') or {}
+        zoom = (map_state or {}).get('zoom')
+        if (streaming and bbox is not None and center and zoom is not None
+                and not gdf_filtered.empty):
+            if viewport is not None:
+                fetched = viewport['fetched']
+            else:
+                # Primeira renderização: todas as feições já estão no mapa
+                b = get_bounds(gdf_filtered)
+                fetched = (min(b[0], bbox[0]), min(b[1], bbox[1]),
+                           max(b[2], bbox[2]), max(b[3], bbox[3]))
+            if bbox_needs_fetch(fetched, bbox):
+                st.session_state.map_viewport = {
+                    'filter_key': filter_key,
+                    'fetched': expand_bbox(bbox),
+                    'center': (center.get('lat'), center.get('lng')),
+                    'zoom': zoom
+                }
+                st.rerun()
 
 # ===== ABA 2: INFORMAÇÕES =====
 with tab2:
@@ -290,17 +610,17 @@ with tab2:
     
     with col1:
         st.subheader("Colunas do Shapefile")
-        st.write(list(gdf.columns))
+        st.write([*df_attributes.columns, 'geometry'])
     
     with col2:
         st.subheader("CRS")
-        st.write(f"**{gdf.crs}**")
+        st.write(f"**{gdf_filtered.crs}**")
     
     st.markdown("---")
     
     st.subheader("Limites Geográficos (lon/lat)")
     if not gdf_filtered.empty:
-        bounds = gdf_filtered.total_bounds
+        bounds = get_bounds(gdf_filtered)
         col1, col2 = st.columns(2)
         with col1:
             st.write(f"**Longitude mínima:** {bounds[0]:.6f}")
@@ -314,7 +634,7 @@ with tab3:
     st.header("Tabela de Dados (Shapefile)")
     
     if not gdf_filtered.empty:
-        df_display = gdf_filtered.drop(columns=['geometry']).copy()
+        df_display = gdf_filtered.drop(columns=['geometry'])
         st.dataframe(df_display, use_container_width=True, height=500)
         
         st.markdown("---")
@@ -331,28 +651,25 @@ with tab4:
     st.header("Dados de Clima")
     
     if df_csv is not None:
-        df_filtered_csv = df_csv.copy()
+        df_filtered_csv = df_csv
         
         # Aplicar filtros
-        if tipo_dado == 'Dados por Estado' and selected_uf and 'UF' in df_filtered_csv.columns:
-            df_filtered_csv = df_filtered_csv[df_filtered_csv['UF'] == selected_uf]
-        
-        elif tipo_dado == 'Dados por Empresa' and selected_empresa and 'EMPRESA' in df_filtered_csv.columns:
-            df_filtered_csv = df_filtered_csv[df_filtered_csv['EMPRESA'] == selected_empresa]
-        
+        csv_filter = {}
+        if tipo_dado == 'Dados por Estado' and selected_uf:
+            csv_filter = {'UF': selected_uf}
+        elif tipo_dado == 'Dados por Empresa' and selected_empresa:
+            csv_filter = {'EMPRESA': selected_empresa}
         elif tipo_dado == 'Dados Empresa/Fazenda' and selected_empresa and selected_fazenda:
-            if 'EMPRESA' in df_filtered_csv.columns and 'FAZENDA' in df_filtered_csv.columns:
-                df_filtered_csv = df_filtered_csv[
-                    (df_filtered_csv['EMPRESA'] == selected_empresa) &
-                    (df_filtered_csv['FAZENDA'] == selected_fazenda)
-                ]
-        
+            csv_filter = {'EMPRESA': selected_empresa, 'FAZENDA': selected_fazenda}
         elif tipo_dado == 'Dados por Município' and selected_uf and selected_municipio:
-            if 'UF' in df_filtered_csv.columns and 'MUNICIPIO' in df_filtered_csv.columns:
-                df_filtered_csv = df_filtered_csv[
-                    (df_filtered_csv['UF'] == selected_uf) &
-                    (df_filtered_csv['MUNICIPIO'] == selected_municipio)
-                ]
+            csv_filter = {'UF': selected_uf, 'MUNICIPIO': selected_municipio}
+        
+        if csv_filter:
+            groups = load_csv_groups(CSV_PATH, tuple(csv_filter))
+            if groups is not None:
+                values = tuple(csv_filter.values())
+                key = values[0] if len(values) == 1 else values
+                df_filtered_csv = df_csv.iloc[groups.get(key, [])]
         
         if not df_filtered_csv.empty:
             st.dataframe(df_filtered_csv, use_container_width=True, height=500)